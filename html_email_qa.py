@@ -1,3 +1,14 @@
+import argparse
+import html
+import io
+import mmap
+import os
+import re
+import time
+from array import array
+from bisect import bisect_right
+from collections import Counter
+from contextlib import redirect_stdout
 from bs4 import BeautifulSoup
 from urllib.parse import urlparse, parse_qs
 
@@ -86,12 +97,14 @@ def check_html_file(file_path):
         anchor_tags_with_name = [tag.attrs['name'] for tag in anchor_img_tags if 'name' in tag.attrs]
         
         
-        for tag in anchor_img_tags[:3]:
+        for tag in anchor_img_tags:
+            if tag.name=='a' and 'href' not in tag.attrs.keys():
+                continue
+
             full_report += f"Line number: {tag.sourceline}\n"
 
             if tag.name=='a':
-                if 'href' in tag.attrs.keys():
-                    href = tag['href']
+                href = tag['href']
                 if href.startswith('#'):
                     full_report += check_frag_id(href=href,anchor_tags_with_name=anchor_tags_with_name)
                 else:
@@ -105,14 +118,283 @@ def check_html_file(file_path):
     
     return full_report
 
-        
-           
+# mmap mode: scan raw bytes instead of building a soup so big archived emails
+# never get decoded into one big string. Comments are matched first so tags
+# inside them are skipped, same as the parser would.
+# a quote only opens a quoted value right after '=', like html.parser, so an
+# unquoted value such as title=O'Brien doesn't swallow the rest of the tag
+TAG_PATTERN = re.compile(rb'<!--.*?-->|<(a|img)(?=[\s/>])((?:=\s*"[^"]*"|=\s*\'[^\']*\'|[^>])*)>', re.IGNORECASE | re.DOTALL)
+ATTR_PATTERN = re.compile(rb'([^\s"\'=/>]+)(?:\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|(?!["\'])([^\s>]+)))?')
+NEWLINE_PATTERN = re.compile(rb'\n')
+RESCAN_MARGIN = 5
+# bytes either side of an edit that could join with it into '<!--' or '-->'
+STRUCTURAL_CONTEXT = 3
+
+def build_newline_index(buffer):
+    newline_offsets = array('Q')
+    for match in NEWLINE_PATTERN.finditer(buffer):
+        newline_offsets.append(match.start())
+    return newline_offsets
+
+def read_tag_attrs(attr_bytes):
+    attrs = {}
+    for attr in ATTR_PATTERN.finditer(attr_bytes):
+        key = attr.group(1).decode('utf-8', 'replace').lower()
+        raw_value = next((group for group in attr.group(2, 3, 4) if group is not None), b'')
+        # only decode the attributes the checks actually look at
+        if key in ('href', 'name', 'src', 'border'):
+            attrs.setdefault(key, html.unescape(raw_value.decode('utf-8', 'replace')))
+    return attrs
+
+def scan_tags(buffer):
+    for match in TAG_PATTERN.finditer(buffer):
+        if match.group(1) is None:
+            continue
+        yield match.group(1).lower().decode('ascii'), read_tag_attrs(match.group(2)), match.start()
+
+def check_tag(tag_name, attrs, anchor_tags_with_name):
+    # report block for one scanned tag, None for anchors without an href
+    if tag_name=='a':
+        if 'href' not in attrs:
+            return None
+        href = attrs['href']
+        if href.startswith('#'):
+            return check_frag_id(href=href,anchor_tags_with_name=anchor_tags_with_name)
+        return check_query_params(href=href)
+
+    return check_image_attributes(image_tag=attrs)
+
+def check_html_file_mmap(file_path):
+
+    full_report=""
+    with open(file_path, 'rb') as file:
+        # mmap refuses empty files
+        if os.fstat(file.fileno()).st_size == 0:
+            return full_report
+
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            newline_offsets = build_newline_index(buffer)
+            anchor_tags_with_name = {attrs['name'] for tag_name, attrs, _ in scan_tags(buffer) if 'name' in attrs}
+
+            for tag_name, attrs, offset in scan_tags(buffer):
+                tag_report = check_tag(tag_name, attrs, anchor_tags_with_name)
+                if tag_report is not None:
+                    full_report += f"Line number: {bisect_right(newline_offsets, offset) + 1}\n"
+                    full_report += tag_report
+
+    return full_report
+
+# watch mode: keep the scanned tags and their findings for each file, and on
+# save rescan from the last tag before the edit (or from the top, for edits
+# near quotes, '>' or comment markers) until the scan lines back up with a tag
+# from the previous run. Everything after that is the old result shifted by
+# the size of the edit, and unchanged tags keep their findings.
+
+def common_prefix_length(old, new):
+    old, new = memoryview(old), memoryview(new)
+    low, high = 0, min(len(old), len(new))
+    while low < high:
+        mid = (low + high + 1) // 2
+        if old[low:mid] == new[low:mid]:
+            low = mid
+        else:
+            high = mid - 1
+    return low
+
+def common_suffix_length(old, new, prefix_length):
+    old, new = memoryview(old), memoryview(new)
+    low, high = 0, min(len(old), len(new)) - prefix_length
+    while low < high:
+        mid = (low + high + 1) // 2
+        if old[len(old) - mid:len(old) - low] == new[len(new) - mid:len(new) - low]:
+            low = mid
+        else:
+            high = mid - 1
+    return low
+
+def scan_token(match, line):
+    # comments are kept as tokens too so a rescan can line back up on them
+    if match.group(1) is None:
+        return {'start': match.start(), 'end': match.end(), 'line': line, 'tag_name': None, 'attrs': {}, 'findings': []}
+    tag_name = match.group(1).lower().decode('ascii')
+    return {'start': match.start(), 'end': match.end(), 'line': line, 'tag_name': tag_name, 'attrs': read_tag_attrs(match.group(2)), 'findings': []}
+
+def check_token(token, anchor_tags_with_name):
+    if token['tag_name'] is None:
+        return
+    with redirect_stdout(io.StringIO()):
+        tag_report = check_tag(token['tag_name'], token['attrs'], anchor_tags_with_name)
+    target = token['attrs'].get('href', token['attrs'].get('src', ''))
+    token['findings'] = [(token['tag_name'], target, line) for line in (tag_report or '').splitlines() if '❌' in line]
+
+def collect_findings(tokens):
+    return [(finding, token['line']) for token in tokens for finding in token['findings']]
+
+def watch_initial_state(content):
+    tokens = []
+    line, line_position = 1, 0
+    for match in TAG_PATTERN.finditer(content):
+        line += content.count(b'\n', line_position, match.start())
+        line_position = match.start()
+        tokens.append(scan_token(match, line))
+
+    anchor_tags_with_name = {token['attrs']['name'] for token in tokens if 'name' in token['attrs']}
+    for token in tokens:
+        check_token(token, anchor_tags_with_name)
+    return {'content': content, 'tokens': tokens, 'anchor_tags_with_name': anchor_tags_with_name}
+
+def recheck_changed_range(state, content):
+    old_content, old_tokens = state['content'], state['tokens']
+    prefix = common_prefix_length(old_content, content)
+    if prefix == len(old_content) == len(content):
+        return None
+    suffix = common_suffix_length(old_content, content, prefix)
+    old_change_end = len(old_content) - suffix
+    new_change_end = len(content) - suffix
+    shift = len(content) - len(old_content)
+    line_shift = content.count(b'\n', prefix, new_change_end) - old_content.count(b'\n', prefix, old_change_end)
+    # kept tokens get re-checked in place below, take the old findings first
+    old_findings = collect_findings(old_tokens)
+
+    # a tag or comment that failed to match in the old scan because a quote or
+    # comment never closed can start matching once quotes, '>' or comment
+    # markers change, so those edits rescan from the top. The edit is widened
+    # by a few bytes because joining existing bytes can form a '<!--' or '-->'
+    # too. Otherwise the old scan was in step with a fresh one after the last
+    # token ending a few bytes before the edit (the tag name check looks ahead
+    # up to 5 bytes).
+    context_start = max(0, prefix - STRUCTURAL_CONTEXT)
+    structural = any(
+        char in changed
+        for changed in (old_content[context_start:old_change_end + STRUCTURAL_CONTEXT], content[context_start:new_change_end + STRUCTURAL_CONTEXT])
+        for char in b'"\'>-'
+    )
+    keep = 0
+    while not structural and keep < len(old_tokens) and old_tokens[keep]['end'] <= prefix - RESCAN_MARGIN:
+        keep += 1
+    scan_start = old_tokens[keep - 1]['end'] if keep else 0
+    line, line_position = (old_tokens[keep - 1]['line'], old_tokens[keep - 1]['start']) if keep else (1, 0)
+    old_token_starts = {token['start']: index for index, token in enumerate(old_tokens[keep:], keep) if token['start'] >= old_change_end}
+    old_tokens_before_edit = {(token['start'], token['end']): token for token in old_tokens[keep:] if token['end'] <= prefix}
+
+    scanned = []
+    rescanned = []
+    tail = []
+    for match in TAG_PATTERN.finditer(content, scan_start):
+        if match.start() >= new_change_end:
+            index = old_token_starts.get(match.start() - shift)
+            if index is not None and old_tokens[index]['end'] == match.end() - shift:
+                tail = [dict(token, start=token['start'] + shift, end=token['end'] + shift, line=token['line'] + line_shift) for token in old_tokens[index:]]
+                break
+        line += content.count(b'\n', line_position, match.start())
+        line_position = match.start()
+        token = old_tokens_before_edit.get(match.span())
+        if token is None:
+            token = scan_token(match, line)
+            rescanned.append(token)
+        scanned.append(token)
+
+    tokens = old_tokens[:keep] + scanned + tail
+    anchor_tags_with_name = {token['attrs']['name'] for token in tokens if 'name' in token['attrs']}
+    for token in rescanned:
+        check_token(token, anchor_tags_with_name)
+    if anchor_tags_with_name != state['anchor_tags_with_name']:
+        # a named anchor was added or removed, fragment links elsewhere may change
+        for token in tokens:
+            if token['attrs'].get('href', '').startswith('#'):
+                check_token(token, anchor_tags_with_name)
+
+    state.update(content=content, tokens=tokens, anchor_tags_with_name=anchor_tags_with_name)
+    return {
+        'byte_range': (prefix, new_change_end),
+        'rescanned': len(rescanned),
+        'old_findings': old_findings,
+        'new_findings': collect_findings(tokens),
+    }
+
+def finding_delta(old_findings, new_findings):
+    # findings are matched on tag target and message, not line, so an edit
+    # that only moves lines around doesn't show up as a change
+    unmatched_old = Counter(finding for finding, _ in old_findings)
+    added = []
+    for finding, line in new_findings:
+        if unmatched_old[finding]:
+            unmatched_old[finding] -= 1
+        else:
+            added.append((finding, line))
+
+    unmatched_new = Counter(finding for finding, _ in new_findings)
+    fixed = []
+    for finding, line in old_findings:
+        if unmatched_new[finding]:
+            unmatched_new[finding] -= 1
+        else:
+            fixed.append((finding, line))
+    return added, fixed
+
+def watch_files(file_paths, interval):
+    states = {}
+    stats = {}
+    for file_path in file_paths:
+        with open(file_path, 'rb') as file:
+            states[file_path] = watch_initial_state(file.read())
+        stat = os.stat(file_path)
+        stats[file_path] = (stat.st_mtime_ns, stat.st_size)
+        findings = collect_findings(states[file_path]['tokens'])
+        print(f"👀 Watching {file_path}: {len(findings)} findings")
+        for (tag_name, target, message), line in findings:
+            print(f"   Line number: {line} {message}")
+
+    try:
+        while True:
+            time.sleep(interval)
+            for file_path in file_paths:
+                try:
+                    stat = os.stat(file_path)
+                except FileNotFoundError:
+                    continue
+                if (stat.st_mtime_ns, stat.st_size) == stats[file_path]:
+                    continue
+                stats[file_path] = (stat.st_mtime_ns, stat.st_size)
+
+                started = time.perf_counter()
+                with open(file_path, 'rb') as file:
+                    content = file.read()
+                result = recheck_changed_range(states[file_path], content)
+                if result is None:
+                    continue
+                added, fixed = finding_delta(result['old_findings'], result['new_findings'])
+                elapsed_ms = (time.perf_counter() - started) * 1000
+
+                start, end = result['byte_range']
+                print(f"📝 {file_path} re-checked bytes {start}-{end} ({result['rescanned']} tags) in {elapsed_ms:.1f} ms: {len(result['new_findings'])} findings")
+                for (tag_name, target, message), line in added:
+                    print(f"   ➕ Line number: {line} {message}")
+                for (tag_name, target, message), line in fixed:
+                    print(f"   💚 Fixed, was line number: {line} {message}")
+    except KeyboardInterrupt:
+        pass
             
 if __name__ == '__main__':
-    html_file_path = 'index.html'  # Replace with the actual path
-    
-    full_report = check_html_file(html_file_path)
+    parser = argparse.ArgumentParser(description='Validate anchor and image tags in html email files')
+    parser.add_argument('files', nargs='*', default=['index.html'], help='html files to check')
+    parser.add_argument('--mmap', action='store_true', help='scan files through mmap without building a full parse tree (for very large exports)')
+    parser.add_argument('--output', default='output_test_2.txt', help='file to write the report to')
+    parser.add_argument('--watch', action='store_true', help='keep checking the files and print the finding changes on every save')
+    parser.add_argument('--interval', type=float, default=0.2, help='seconds between checks for changes in watch mode')
+    args = parser.parse_args()
+
+    if args.watch:
+        watch_files(args.files, args.interval)
+        raise SystemExit
+
+    full_report = ""
+    for html_file_path in args.files:
+        if args.mmap:
+            full_report += check_html_file_mmap(html_file_path)
+        else:
+            full_report += check_html_file(html_file_path)
 
-    with open('output_test_2.txt', 'w') as file:
+    with open(args.output, 'w') as file:
         file.write(full_report)
 
@@ -32,9 +32,11 @@ load_dotenv()
 
 slack_api_token = os.getenv("SLACK_API_TOKEN")
 slack_app_token = os.getenv("SLACK_APP_TOKEN")
+# Point at a local Slack stand-in (see slack_load_test.py) instead of slack.com
+slack_api_base_url = os.getenv("SLACK_API_BASE_URL", WebClient.BASE_URL)
 signature_verifier = SignatureVerifier(slack_app_token)
 
-web_client = WebClient(token=slack_api_token)
+web_client = WebClient(token=slack_api_token, base_url=slack_api_base_url)
 
 client = SocketModeClient(
     app_token=slack_app_token,
@@ -0,0 +1,461 @@
+import os
+import sys
+import json
+import math
+import time
+import hmac
+import base64
+import random
+import socket
+import struct
+import hashlib
+import logging
+import argparse
+import tempfile
+import threading
+import subprocess
+import socketserver
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask, request, jsonify, Response
+from werkzeug.serving import make_server
+import requests
+
+# Local load test for the email qa bot. A fake Slack (web api, file hosting
+# and a socket mode websocket) runs in this process, the bot runs as a
+# subprocess pointed at it through SLACK_API_BASE_URL, and the driver replays
+# concurrent submissions and measures time until the bot's replies land.
+
+EMAIL_QA_AUTOMATION_CHANNEL_ID = "C0883CP5U3E"
+FAKE_BOT_TOKEN = "xoxb-load-test"
+FAKE_APP_TOKEN = "xapp-load-test"
+FAKE_SIGNING_SECRET = "load-test-signing-secret"
+FAKE_USER_ID = "U0LOADTEST"
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+SERVICE_SCRIPTS = {
+    'flask': 'slack_email_qa_flask.py',
+    'socket': 'slack_email_qa.py',
+}
+# every valid submission gets a full report and an error report uploaded
+EXPECTED_UPLOADS_PER_SUBMISSION = 2
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    # nearest-rank
+    index = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+def generate_email(index, utm_campaign, links):
+    # Mix of passing and failing tags so every checker path gets exercised
+    parts = ['<!DOCTYPE html>\n<html>\n<body>\n<a name="top"></a>\n']
+    for link in range(links):
+        if link % 5 == 4:
+            parts.append(f'<a href="https://www.ohlq.com/?utm_source=braze&amp;utm_medium=sms&amp;utm_campaign={utm_campaign}">broken link {link}</a>\n')
+        else:
+            parts.append(f'<a href="https://www.ohlq.com/p/{index}/{link}?utm_source=braze&amp;utm_medium=email&amp;utm_campaign={utm_campaign}&amp;utm_content=block-{link}&amp;utm_term=item-{link}">link {link}</a>\n')
+        if link % 3 == 0:
+            src = "https://braze-images.com/img.png" if link % 2 else "https://appboy-images.com/img.png"
+            parts.append(f'<img src="{src}" border="{0 if link % 4 else 1}">\n')
+    parts.append('<a href="#top">back to top</a>\n<a href="#missing">missing</a>\n</body>\n</html>\n')
+    return ''.join(parts)
+
+
+class FakeSlack:
+
+    def __init__(self, latency_ms, rate_limit_ratio):
+        self.latency_ms = latency_ms
+        self.rate_limit_ratio = rate_limit_ratio
+        self.lock = threading.Lock()
+        self.hosted_files = {}
+        self.threads = {}
+        self.rate_limited = 0
+        self.websockets = []
+        self.websocket_connected = threading.Event()
+        self.next_id = 0
+
+        self.http_port = free_port()
+        self.websocket_port = free_port()
+        self.base_url = f"http://127.0.0.1:{self.http_port}"
+
+        self.app = Flask(__name__)
+        self.app.add_url_rule('/api/apps.connections.open', view_func=self.apps_connections_open, methods=['POST'])
+        self.app.add_url_rule('/api/files.getUploadURLExternal', view_func=self.files_get_upload_url_external, methods=['POST'])
+        self.app.add_url_rule('/api/files.completeUploadExternal', view_func=self.files_complete_upload_external, methods=['POST'])
+        self.app.add_url_rule('/api/chat.postMessage', view_func=self.chat_post_message, methods=['POST'])
+        self.app.add_url_rule('/upload/<file_id>', view_func=self.upload, methods=['POST'])
+        self.app.add_url_rule('/files/<file_id>', view_func=self.url_private, methods=['GET'])
+
+    def start(self):
+        logging.getLogger('werkzeug').setLevel(logging.ERROR)
+        self.http_server = make_server('127.0.0.1', self.http_port, self.app, threaded=True)
+        threading.Thread(target=self.http_server.serve_forever, daemon=True).start()
+
+        fake_slack = self
+
+        class WebSocketHandler(socketserver.BaseRequestHandler):
+            def handle(self):
+                fake_slack.serve_websocket(self.request)
+
+        socketserver.ThreadingTCPServer.allow_reuse_address = True
+        self.websocket_server = socketserver.ThreadingTCPServer(('127.0.0.1', self.websocket_port), WebSocketHandler)
+        self.websocket_server.daemon_threads = True
+        threading.Thread(target=self.websocket_server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self.http_server.shutdown()
+        self.websocket_server.shutdown()
+        with self.lock:
+            for sock, _ in self.websockets:
+                sock.close()
+            self.websockets = []
+        self.websocket_connected.clear()
+
+    def new_id(self, prefix):
+        with self.lock:
+            self.next_id += 1
+            return f"{prefix}{self.next_id:08d}"
+
+    # ---- submissions
+
+    def host_file(self, html_content):
+        file_id = self.new_id('F')
+        self.hosted_files[file_id] = html_content.encode('utf-8')
+        return {
+            "id": file_id,
+            "name": f"{file_id}.html",
+            "filetype": "html",
+            "url_private": f"{self.base_url}/files/{file_id}",
+        }
+
+    def track_thread(self, thread_ts):
+        with self.lock:
+            self.threads[thread_ts] = {'uploads': [], 'messages': [], 'done': threading.Event()}
+        return self.threads[thread_ts]
+
+    def record_reply(self, thread_ts, kind):
+        with self.lock:
+            thread = self.threads.get(thread_ts)
+            if thread is None:
+                return
+            thread[kind].append(time.perf_counter())
+            if thread['messages'] or len(thread['uploads']) >= EXPECTED_UPLOADS_PER_SUBMISSION:
+                thread['done'].set()
+
+    # ---- web api
+
+    def simulate_network(self):
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        if random.random() < self.rate_limit_ratio:
+            with self.lock:
+                self.rate_limited += 1
+            response = jsonify({"ok": False, "error": "ratelimited"})
+            response.status_code = 429
+            response.headers['Retry-After'] = '1'
+            return response
+        return None
+
+    def request_params(self):
+        return request.get_json(silent=True) or request.values.to_dict()
+
+    def apps_connections_open(self):
+        return jsonify({"ok": True, "url": f"ws://127.0.0.1:{self.websocket_port}/link/?ticket=load-test"})
+
+    def files_get_upload_url_external(self):
+        rate_limited = self.simulate_network()
+        if rate_limited is not None:
+            return rate_limited
+        file_id = self.new_id('F')
+        return jsonify({"ok": True, "upload_url": f"{self.base_url}/upload/{file_id}", "file_id": file_id})
+
+    def upload(self, file_id):
+        rate_limited = self.simulate_network()
+        if rate_limited is not None:
+            return rate_limited
+        return Response(f"OK - {len(request.files)}", status=200)
+
+    def files_complete_upload_external(self):
+        rate_limited = self.simulate_network()
+        if rate_limited is not None:
+            return rate_limited
+        self.record_reply(self.request_params().get('thread_ts'), 'uploads')
+        return jsonify({"ok": True, "files": []})
+
+    def chat_post_message(self):
+        rate_limited = self.simulate_network()
+        if rate_limited is not None:
+            return rate_limited
+        params = self.request_params()
+        self.record_reply(params.get('thread_ts'), 'messages')
+        return jsonify({"ok": True, "channel": params.get('channel'), "ts": f"{time.time():.6f}"})
+
+    def url_private(self, file_id):
+        rate_limited = self.simulate_network()
+        if rate_limited is not None:
+            return rate_limited
+        if request.headers.get('Authorization') != f"Bearer {FAKE_BOT_TOKEN}":
+            return Response("not_authed", status=403)
+        if file_id not in self.hosted_files:
+            return Response("file_not_found", status=404)
+        return Response(self.hosted_files[file_id], mimetype='text/html')
+
+    # ---- socket mode websocket
+
+    def serve_websocket(self, sock):
+        handshake = b''
+        while b'\r\n\r\n' not in handshake:
+            chunk = sock.recv(4096)
+            if not chunk:
+                return
+            handshake += chunk
+
+        headers = {}
+        for line in handshake.decode('latin-1').split('\r\n')[1:]:
+            if ':' in line:
+                key, value = line.split(':', 1)
+                headers[key.strip().lower()] = value.strip()
+        accept = base64.b64encode(hashlib.sha1((headers['sec-websocket-key'] + WEBSOCKET_GUID).encode()).digest()).decode()
+        sock.sendall(
+            "HTTP/1.1 101 Switching Protocols\r\n"
+            "Upgrade: websocket\r\n"
+            "Connection: Upgrade\r\n"
+            f"Sec-WebSocket-Accept: {accept}\r\n\r\n".encode()
+        )
+
+        send_lock = threading.Lock()
+        with self.lock:
+            self.websockets.append((sock, send_lock))
+        self.websocket_connected.set()
+        self.send_websocket_frame(sock, send_lock, 0x1, json.dumps({"type": "hello", "num_connections": 1}).encode())
+
+        try:
+            while True:
+                opcode, payload = self.read_websocket_frame(sock)
+                if opcode is None or opcode == 0x8:
+                    break
+                if opcode == 0x9:
+                    self.send_websocket_frame(sock, send_lock, 0xA, payload)
+                # text frames are envelope acks from the bot, nothing to do with them
+        except OSError:
+            pass
+        finally:
+            with self.lock:
+                self.websockets = [connection for connection in self.websockets if connection[0] is not sock]
+                if not self.websockets:
+                    self.websocket_connected.clear()
+
+    def read_exactly(self, sock, size):
+        data = b''
+        while len(data) < size:
+            chunk = sock.recv(size - len(data))
+            if not chunk:
+                return None
+            data += chunk
+        return data
+
+    def read_websocket_frame(self, sock):
+        header = self.read_exactly(sock, 2)
+        if header is None:
+            return None, None
+        opcode = header[0] & 0x0F
+        length = header[1] & 0x7F
+        if length == 126:
+            (length,) = struct.unpack('!H', self.read_exactly(sock, 2))
+        elif length == 127:
+            (length,) = struct.unpack('!Q', self.read_exactly(sock, 8))
+        mask = self.read_exactly(sock, 4) if header[1] & 0x80 else b'\x00\x00\x00\x00'
+        payload = self.read_exactly(sock, length) if length else b''
+        if mask is None or payload is None:
+            return None, None
+        return opcode, bytes(byte ^ mask[i % 4] for i, byte in enumerate(payload))
+
+    def send_websocket_frame(self, sock, send_lock, opcode, payload):
+        if len(payload) < 126:
+            header = struct.pack('!BB', 0x80 | opcode, len(payload))
+        elif len(payload) < 65536:
+            header = struct.pack('!BBH', 0x80 | opcode, 126, len(payload))
+        else:
+            header = struct.pack('!BBQ', 0x80 | opcode, 127, len(payload))
+        with send_lock:
+            sock.sendall(header + payload)
+
+    # ---- event delivery
+
+    def deliver_socket_mode_event(self, event):
+        envelope = {
+            "envelope_id": self.new_id('E'),
+            "type": "events_api",
+            "accepts_response_payload": False,
+            "retry_attempt": 0,
+            "retry_reason": "",
+            "payload": {"type": "event_callback", "event": event},
+        }
+        with self.lock:
+            if not self.websockets:
+                return False
+            sock, send_lock = self.websockets[-1]
+        self.send_websocket_frame(sock, send_lock, 0x1, json.dumps(envelope).encode('utf-8'))
+        return True
+
+
+def sign_request(body, signing_secret):
+    timestamp = str(int(time.time()))
+    base_string = f"v0:{timestamp}:".encode() + body
+    signature = "v0=" + hmac.new(signing_secret.encode(), base_string, hashlib.sha256).hexdigest()
+    return {
+        "X-Slack-Request-Timestamp": timestamp,
+        "X-Slack-Signature": signature,
+        "Content-Type": "application/json",
+    }
+
+def deliver_flask_event(service_url, event, timeout):
+    body = json.dumps({
+        "type": "event_callback",
+        "event_id": f"Ev{event['ts'].replace('.', '')}",
+        "event": event,
+    }).encode('utf-8')
+    response = requests.post(f"{service_url}/slack/events", data=body, headers=sign_request(body, FAKE_SIGNING_SECRET), timeout=timeout)
+    return response.status_code
+
+def start_service(service, fake_slack, work_dir):
+    script_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), SERVICE_SCRIPTS[service])
+    env = dict(
+        os.environ,
+        SLACK_API_TOKEN=FAKE_BOT_TOKEN,
+        SLACK_APP_TOKEN=FAKE_APP_TOKEN,
+        SIGNING_SECRET=FAKE_SIGNING_SECRET,
+        SLACK_API_BASE_URL=f"{fake_slack.base_url}/api/",
+    )
+    service_url = None
+    if service == 'flask':
+        port = free_port()
+        service_url = f"http://127.0.0.1:{port}"
+        command = [sys.executable, '-m', 'flask', '--app', script_path, 'run', '--host', '127.0.0.1', '--port', str(port), '--with-threads']
+    else:
+        command = [sys.executable, script_path]
+
+    # the bot writes its report files into cwd, keep them out of the repo
+    process = subprocess.Popen(command, cwd=work_dir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{SERVICE_SCRIPTS[service]} exited with code {process.returncode}")
+        if service == 'flask':
+            try:
+                with socket.create_connection(('127.0.0.1', port), timeout=0.2):
+                    return process, service_url
+            except OSError:
+                pass
+        elif fake_slack.websocket_connected.is_set():
+            return process, service_url
+        time.sleep(0.1)
+
+    process.kill()
+    raise RuntimeError(f"{SERVICE_SCRIPTS[service]} did not come up within 30 seconds")
+
+def run_submission(service, fake_slack, service_url, index, utm_campaign, links, timeout):
+    file_info = fake_slack.host_file(generate_email(index, utm_campaign, links))
+    thread_ts = f"{int(time.time())}.{int(fake_slack.new_id('')):06d}"
+    event = {
+        "type": "message",
+        "channel": EMAIL_QA_AUTOMATION_CHANNEL_ID,
+        "user": FAKE_USER_ID,
+        "text": utm_campaign,
+        "ts": thread_ts,
+        "files": [file_info],
+    }
+    thread = fake_slack.track_thread(thread_ts)
+
+    started = time.perf_counter()
+    if service == 'flask':
+        # the flask bot does all its work before answering the event post, so
+        # a 5xx here is the bot failing (e.g. an uncaught 429), not delivery
+        try:
+            status_code = deliver_flask_event(service_url, event, timeout)
+        except requests.ConnectionError:
+            return 'delivery_error', None
+        except requests.Timeout:
+            return 'timeout', None
+        if status_code >= 500:
+            return 'bot_error', None
+        if status_code != 200:
+            return 'delivery_error', None
+        # every reply has reached the fake slack by the time the 200 comes
+        # back. Anything missing was swallowed by the bot (e.g. a 429 on the
+        # upload), so don't sit out the timeout waiting for it
+        if not thread['done'].is_set():
+            return 'incomplete_reply', None
+    elif not fake_slack.deliver_socket_mode_event(event):
+        return 'delivery_error', None
+    elif not thread['done'].wait(max(0, timeout - (time.perf_counter() - started))):
+        return 'timeout', None
+
+    if thread['messages']:
+        return 'error_reply', None
+    return 'ok', thread['uploads'][EXPECTED_UPLOADS_PER_SUBMISSION - 1] - started
+
+def run_load_test(service, args):
+    fake_slack = FakeSlack(latency_ms=args.latency_ms, rate_limit_ratio=args.rate_limit_ratio)
+    fake_slack.start()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        process, service_url = start_service(service, fake_slack, work_dir)
+        try:
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+                futures = [
+                    executor.submit(run_submission, service, fake_slack, service_url, index, args.utm_campaign, args.links, args.timeout)
+                    for index in range(args.requests)
+                ]
+                results = [future.result() for future in futures]
+            elapsed = time.perf_counter() - started
+        finally:
+            process.terminate()
+            try:
+                process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                process.kill()
+            fake_slack.stop()
+
+    return results, elapsed, fake_slack.rate_limited
+
+def print_report(service, results, elapsed, rate_limited):
+    latencies = sorted(latency * 1000 for outcome, latency in results if outcome == 'ok')
+    total = len(results)
+    outcomes = {outcome: sum(1 for result, _ in results if result == outcome) for outcome in ['ok', 'error_reply', 'bot_error', 'incomplete_reply', 'timeout', 'delivery_error']}
+
+    print(f"📈 {SERVICE_SCRIPTS[service]}")
+    print(f"Submissions: {total} in {elapsed:.2f}s")
+    print(f"Throughput: {outcomes['ok'] / elapsed:.2f} completed/s")
+    if latencies:
+        print(f"Latency ms: p50 {percentile(latencies, 50):.1f}  p95 {percentile(latencies, 95):.1f}  p99 {percentile(latencies, 99):.1f}  max {latencies[-1]:.1f}")
+    else:
+        print("Latency ms: no completed submissions")
+    for outcome, count in outcomes.items():
+        print(f"{outcome}: {count} ({count / total * 100 if total else 0:.1f}%)")
+    print(f"429s injected by fake slack: {rate_limited}\n")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Load test the email qa bot against a local fake Slack')
+    parser.add_argument('--service', choices=['flask', 'socket', 'both'], default='both', help='which bot to run')
+    parser.add_argument('--requests', type=int, default=50, help='number of submissions to replay')
+    parser.add_argument('--concurrency', type=int, default=10, help='submissions in flight at once')
+    parser.add_argument('--links', type=int, default=40, help='links per generated email')
+    parser.add_argument('--utm-campaign', default='load-test-campaign', help='utm_campaign text sent with each submission')
+    parser.add_argument('--latency-ms', type=float, default=0, help='latency added to every fake slack api call')
+    parser.add_argument('--rate-limit-ratio', type=float, default=0, help='share of fake slack api calls answered with 429')
+    parser.add_argument('--timeout', type=float, default=30, help='seconds to wait for the bot to reply to a submission')
+    args = parser.parse_args()
+
+    services = ['flask', 'socket'] if args.service == 'both' else [args.service]
+    for service in services:
+        results, elapsed, rate_limited = run_load_test(service, args)
+        print_report(service, results, elapsed, rate_limited)
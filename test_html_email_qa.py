@@ -0,0 +1,103 @@
+import io
+import os
+import random
+from contextlib import redirect_stdout
+
+import pytest
+
+from html_email_qa import check_html_file, check_html_file_mmap, recheck_changed_range, watch_initial_state
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def run_quietly(check, file_path):
+    # the checkers print each error as they go
+    with redirect_stdout(io.StringIO()):
+        return check(file_path)
+
+
+@pytest.mark.parametrize('file_name', ['email1.html', 'index.html'])
+def test_mmap_check_matches_default_check(file_name):
+    file_path = os.path.join(REPO_DIR, file_name)
+
+    assert run_quietly(check_html_file_mmap, file_path) == run_quietly(check_html_file, file_path)
+
+
+def test_mmap_check_keeps_tag_with_apostrophe_in_unquoted_value(tmp_path):
+    html_file = tmp_path / 'apostrophe.html'
+    html_file.write_bytes(b'<p>\n<a title=O\'Brien href="https://x.com/?utm_source=braze">x</a>\n<img src="bad" border="1">\n</p>\n')
+
+    report = run_quietly(check_html_file_mmap, str(html_file))
+    assert 'Link https://x.com/?utm_source=braze' in report
+    assert report == run_quietly(check_html_file, str(html_file))
+
+
+def test_mmap_check_of_empty_file(tmp_path):
+    empty_file = tmp_path / 'empty.html'
+    empty_file.write_bytes(b'')
+
+    assert check_html_file_mmap(str(empty_file)) == ''
+
+# small document with an unterminated comment and quote so edits keep
+# opening and closing them
+SAMPLE = (
+    b'<!-- header\n'
+    b'<a name="top"></a>\n'
+    b'<a href="https://x.com/?utm_source=braze&utm_medium=email">x</a>\n'
+    b'<img src="https://braze-images.com/a.png" border="0">\n'
+    b'--x>\n'
+    b'<a href="#top">up</a> <a href="#nope">y</a>\n'
+    b'<img src=\'bad\' border=1>\n'
+    b'<p title="open>\n'
+    b'<!-- unterminated\n'
+    b'<a href="https://y.com/?utm_content=">z</a>\n'
+)
+EDIT_SNIPPETS = [
+    b'<!--', b'-->', b'-', b'>', b'<', b'"', b"'", b'\n', b' ', b'x',
+    b'<a href="#top">', b'<a name="nope">', b'<img border="1">', b'<a ', b'<img',
+]
+
+
+def token_view(tokens):
+    return [(t['start'], t['end'], t['line'], t['tag_name'], t['attrs'], t['findings']) for t in tokens]
+
+
+def test_recheck_sees_comment_closed_by_deletion():
+    old = b'<!-- start\n<a href="https://x.com/?utm_source=braze">x</a>\n<img src="bad" border="1">\n--x>\n<a href="#nope">y</a>\n'
+    new = old.replace(b'--x>', b'-->')
+
+    state = watch_initial_state(old)
+    recheck_changed_range(state, new)
+
+    assert token_view(state['tokens']) == token_view(watch_initial_state(new)['tokens'])
+    assert [token['tag_name'] for token in state['tokens']] == [None, 'a']
+
+
+@pytest.mark.parametrize('seed', range(8))
+def test_recheck_matches_full_scan_after_random_edits(seed):
+    rng = random.Random(seed)
+    content = SAMPLE
+    state = watch_initial_state(content)
+
+    for _ in range(1000):
+        edited = bytearray(content)
+        for _ in range(rng.randint(1, 2)):
+            position = rng.randrange(len(edited) + 1)
+            markers = [index for index, byte in enumerate(edited) if byte in b'->"\'']
+            if markers and rng.random() < 0.5:
+                # edit right next to existing markers so deletions can join them
+                position = max(0, min(len(edited), rng.choice(markers) + rng.randint(-2, 2)))
+            action = rng.random()
+            if action < 0.4:
+                edited[position:position] = rng.choice(EDIT_SNIPPETS)
+            elif action < 0.8:
+                del edited[position:position + rng.choice([1, 1, rng.randint(1, 6)])]
+            else:
+                edited[position:position + rng.randint(1, 3)] = rng.choice(EDIT_SNIPPETS)
+        if rng.random() < 0.05:
+            edited = bytearray(SAMPLE)
+        content = bytes(edited)
+
+        recheck_changed_range(state, content)
+        assert token_view(state['tokens']) == token_view(watch_initial_state(content)['tokens'])
+